@@ -0,0 +1,448 @@
+import time
+import random
+import threading
+import concurrent.futures
+import collections
+import functools
+import itertools
+import selectors
+import socket
+import dns.name
+import dns.message
+import dns.exception
+import dns.flags
+import dns.query
+import dns.rdatatype
+
+ROOT_SERVERS = (
+    "198.41.0.4",
+    "199.9.14.201",
+    "192.33.4.12",
+    "199.7.91.13",
+    "192.203.230.10",
+    "192.5.5.241",
+    "192.112.36.4",
+    "198.97.190.53",
+    "192.36.148.17",
+    "192.58.128.30",
+    "193.0.14.129",
+    "199.7.83.42",
+    "202.12.27.33",
+)
+
+MIN_TTL = 5
+MAX_TTL = 86400
+
+# Bound once at import; rdtype comparisons run on every rrset in every
+# section of every response, and a module global is cheaper to load than
+# two attribute lookups.
+# Root choice uses the OS entropy source so concurrent processes do not all
+# start from the same anycast instance.
+_RNG = random.SystemRandom()
+
+_A = dns.rdatatype.A
+_CNAME = dns.rdatatype.CNAME
+_NS = dns.rdatatype.NS
+_SOA = dns.rdatatype.SOA
+
+# Keep fan-out small so authoritative servers are not hammered.
+MAX_PARALLEL = 3
+
+# (name, rdtype) -> (expiry_monotonic, rrset_list). dns.name.Name hashes and
+# compares case-insensitively, so the Name itself is the key. rrset_list is
+# the _NEGATIVE sentinel for cached NXDOMAIN / no-data results.
+_CACHE = {}
+_NEGATIVE = object()
+
+# (name, rdtype) -> Future for resolutions currently on the wire, so
+# concurrent callers asking for the same name share one walk of the
+# hierarchy instead of sending duplicate queries.
+_INFLIGHT = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+# User input is the one place strings still enter the resolver; memoize the
+# parse so repeated lookups of the same domain skip label processing.
+_name_from_text = functools.lru_cache(maxsize=1024)(dns.name.from_text)
+
+def rotated_roots():
+    # One O(1) rotate by a random offset spreads first hops across the 13
+    # root instances without the O(n) shuffle or a sampled copy.
+    roots = collections.deque(ROOT_SERVERS)
+    roots.rotate(_RNG.randrange(len(ROOT_SERVERS)))
+    return roots
+
+def build_query(name):
+    # Advertise a 1232-byte EDNS payload (the DNS Flag Day 2020 size) so
+    # servers can return large glue sets in one datagram instead of
+    # truncating at the classic 512-byte limit.
+    return dns.message.make_query(name, _A, use_edns=0, payload=1232,
+                                  want_dnssec=False)
+
+def cache_key(name, rdtype):
+    return (name, rdtype)
+
+def cache_get(key, now=None):
+    entry = _CACHE.get(key)
+    if entry is None:
+        return None
+    if now is None:
+        now = time.monotonic()
+    expiry, rrsets = entry
+    if now >= expiry:
+        # pop() keeps expiry eviction safe when two threads race past the
+        # check; del would raise KeyError for the loser.
+        _CACHE.pop(key, None)
+        return None
+    return rrsets
+
+def cache_put(rrset, now):
+    ttl = max(MIN_TTL, min(rrset.ttl, MAX_TTL))
+    key = cache_key(rrset.name, rrset.rdtype)
+    entry = _CACHE.get(key)
+    if entry is not None and entry[1] is not _NEGATIVE:
+        # Dedup by equality: re-walking a delegation parses fresh but
+        # equal-content rrset objects, which must replace, not join, the
+        # copy already cached under this key.
+        existing = [rr for rr in entry[1] if rr != rrset]
+        _CACHE[key] = (now + ttl, existing + [rrset])
+    else:
+        _CACHE[key] = (now + ttl, [rrset])
+
+def cache_put_negative(name, rdtype, soa_rrset, now):
+    ttl = max(MIN_TTL, min(soa_rrset[0].minimum, MAX_TTL))
+    _CACHE[cache_key(name, rdtype)] = (now + ttl, _NEGATIVE)
+
+def cache_response(response, now):
+    for section in (response.answer, response.additional, response.authority):
+        for rrset in section:
+            cache_put(rrset, now)
+
+def handle_response(response: dns.message.Message) -> tuple:
+    """Classify one response into a (tag, payload) action:
+
+        ('answer', (a_rrsets, cnames))   terminal A answer
+        ('cname', (cnames, new_target))  alias to chase from the roots
+        ('delegate', ips)                glue addresses to query next
+        ('need_ns', ns_targets)          glueless delegation
+        ('nodata', soa_rrset)            authoritative no-data result
+        ('dead_end', None)               nothing usable in the response
+
+    Pure over the message -- no resolver state, cache access, or I/O -- so
+    the dispatch-heavy branch selection is one self-contained, annotated
+    unit that a mypyc/Cython build could compile on its own.
+    """
+    if response.answer:
+        # Classify each answer rrset once instead of re-walking the
+        # section for the A/CNAME existence checks and again per type.
+        a_rrsets: list = []
+        cnames: list = []
+        for rrset in response.answer:
+            rdtype = rrset.rdtype
+            if rdtype == _A:
+                a_rrsets.append(rrset)
+            elif rdtype == _CNAME:
+                cnames.append(rrset)
+        if a_rrsets:
+            return ('answer', (a_rrsets, cnames))
+        if cnames:
+            return ('cname', (cnames, cnames[-1][0].target))
+
+    # Match delegation NS targets against additional-section glue with a
+    # single dict lookup per target rather than rescanning the additional
+    # section for every NS record.
+    glue_map: dict = {}
+    for rrset in response.additional:
+        if rrset.rdtype == _A:
+            addrs = glue_map.setdefault(rrset.name, [])
+            for r in rrset:
+                addrs.append(r.address)
+
+    ns_targets: list = []
+    for rrset in response.authority:
+        if rrset.rdtype == _NS:
+            for r in rrset:
+                ns_targets.append(r.target)
+
+    glue: list = []
+    for tgt in ns_targets:
+        addrs = glue_map.get(tgt)
+        if addrs:
+            glue.extend(addrs)
+    if not glue and glue_map:
+        # Some servers return glue whose names do not line up with the
+        # authority section; fall back to everything offered.
+        for addrs in glue_map.values():
+            glue.extend(addrs)
+    if glue:
+        return ('delegate', glue)
+
+    if ns_targets:
+        return ('need_ns', list(dict.fromkeys(ns_targets)))
+
+    for rrset in response.authority:
+        if rrset.rdtype == _SOA:
+            return ('nodata', rrset)
+    return ('dead_end', None)
+
+class ResolverState:
+    # One in-progress resolution: either the caller's query or an NS-hostname
+    # lookup spawned to fill in missing glue for a parent entry.
+    __slots__ = ("target", "query", "wire", "nameserver_ips", "hops_left",
+                 "accumulated", "pending_ns", "is_ns_lookup")
+
+    def __init__(self, target, hops_left, is_ns_lookup=False):
+        self.target = target
+        self.query = build_query(target)
+        self.wire = self.query.to_wire()
+        self.nameserver_ips = rotated_roots()
+        self.hops_left = hops_left
+        self.accumulated = []
+        self.pending_ns = None
+        self.is_ns_lookup = is_ns_lookup
+
+def resolve_iterative(domain, timeout=3, max_hops=10):
+    q = _name_from_text(domain)
+    key = cache_key(q, _A)
+    with _INFLIGHT_LOCK:
+        fut = _INFLIGHT.get(key)
+        owner = fut is None
+        if owner:
+            fut = concurrent.futures.Future()
+            _INFLIGHT[key] = fut
+    if not owner:
+        # Another caller is already resolving this name; wait for its
+        # result (bounded by the owner's worst-case budget).
+        return fut.result(timeout=timeout * max_hops)
+    try:
+        result = _resolve(q, domain, timeout, max_hops)
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    else:
+        fut.set_result(result)
+        return result
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.pop(key, None)
+
+def _resolve(q, domain, timeout, max_hops):
+    def answer_from_cache(name, accumulated):
+        # Follow cached CNAMEs toward a cached A rrset; returns the full
+        # answer list on a hit, None as soon as the chain leaves the cache.
+        now = time.monotonic()
+        for _ in range(max_hops):
+            cached = cache_get(cache_key(name, _A), now)
+            if cached is _NEGATIVE:
+                raise Exception(f"No A record for {domain}; authority contains SOA")
+            if cached is not None:
+                return accumulated + cached
+            cached = cache_get(cache_key(name, _CNAME), now)
+            if not cached or cached is _NEGATIVE:
+                return None
+            accumulated = accumulated + cached
+            name = cached[-1][0].target
+        return None
+
+    def cached_a_ips(name, now):
+        # Like answer_from_cache but yields plain addresses, for turning a
+        # finished NS-hostname lookup back into usable nameserver IPs.
+        for _ in range(max_hops):
+            cached = cache_get(cache_key(name, _A), now)
+            if cached is not None and cached is not _NEGATIVE:
+                ips = []
+                for rrset in cached:
+                    for rr in rrset:
+                        ips.append(rr.address)
+                return ips
+            cached = cache_get(cache_key(name, _CNAME), now)
+            if not cached or cached is _NEGATIVE:
+                return []
+            name = cached[-1][0].target
+        return []
+
+    def query_batch(state):
+        response = None
+        last_exc = None
+        qid = state.query.id
+        candidates = iter(state.nameserver_ips)
+        while True:
+            batch = list(itertools.islice(candidates, MAX_PARALLEL))
+            if not batch:
+                break
+            pending = set()
+            for ns_ip in batch:
+                # A full send buffer is transient; retry with capped backoff
+                # rather than either spinning forever or dropping the server.
+                for attempt in range(5):
+                    try:
+                        sock.sendto(state.wire, (ns_ip, 53))
+                        pending.add(ns_ip)
+                        break
+                    except BlockingIOError as e:
+                        last_exc = e
+                        time.sleep(min(1 << attempt, 8) * 0.05)
+                    except OSError as e:
+                        last_exc = e
+                        break
+            deadline = time.monotonic() + timeout
+            while pending and response is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    last_exc = dns.exception.Timeout()
+                    break
+                if not sel.select(remaining):
+                    continue
+                # Drain every datagram that is already readable; stray or
+                # mismatched replies are dropped by the id/address checks.
+                while response is None:
+                    try:
+                        data, addr = sock.recvfrom(65535)
+                    except BlockingIOError:
+                        break
+                    if addr[0] not in pending:
+                        continue
+                    try:
+                        msg = dns.message.from_wire(data)
+                    except Exception as e:
+                        last_exc = e
+                        continue
+                    if msg.id != qid:
+                        continue
+                    if msg.flags & dns.flags.TC:
+                        # The rare response that still does not fit the
+                        # EDNS payload is retried over TCP.
+                        try:
+                            msg = dns.query.tcp(state.query, addr[0], timeout=timeout)
+                        except Exception as e:
+                            last_exc = e
+                            continue
+                    response = msg
+            if response is not None:
+                break
+        return response, last_exc
+
+    cached_answer = answer_from_cache(q, [])
+    if cached_answer is not None:
+        return cached_answer
+
+    # Each resolution owns one UDP socket for all of its hops: replies for
+    # concurrent resolutions are isolated by the kernel instead of racing
+    # over a shared fd, while the per-query socket setup/teardown that
+    # dns.query.udp paid is still amortized across the whole walk.
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    sel = selectors.DefaultSelector()
+    sel.register(sock, selectors.EVENT_READ)
+    try:
+        work = collections.deque([ResolverState(q, max_hops)])
+        while work:
+            state = work.pop()
+
+            if state.pending_ns is not None:
+                # Resuming after child NS lookups; their A records (if any) are
+                # now in the cache.
+                now = time.monotonic()
+                resolved = []
+                seen = set()
+                for nh in state.pending_ns:
+                    for ip in cached_a_ips(nh, now):
+                        if ip not in seen:
+                            seen.add(ip)
+                            resolved.append(ip)
+                pending = state.pending_ns
+                state.pending_ns = None
+                if not resolved:
+                    if state.is_ns_lookup:
+                        continue
+                    raise Exception("Could not resolve delegated nameserver hostnames: "
+                                    + ", ".join(nh.to_text() for nh in pending))
+                state.nameserver_ips = resolved
+
+            if state.hops_left <= 0:
+                if state.is_ns_lookup:
+                    continue
+                raise Exception("Exceeded maximum hops while resolving " + domain)
+            state.hops_left -= 1
+
+            response, last_exc = query_batch(state)
+            if response is None:
+                if state.is_ns_lookup:
+                    continue
+                raise Exception(f"Unable to reach nameservers {state.nameserver_ips} - last error: {last_exc}")
+
+            now = time.monotonic()
+            cache_response(response, now)
+            action, payload = handle_response(response)
+
+            if action == 'answer':
+                a_rrsets, cnames = payload
+                state.accumulated.extend(cnames)
+                if state.is_ns_lookup:
+                    continue
+                state.accumulated.extend(a_rrsets)
+                return state.accumulated
+
+            if action == 'cname':
+                cnames, new_target = payload
+                state.accumulated.extend(cnames)
+                state.target = new_target
+                state.query = build_query(state.target)
+                state.wire = state.query.to_wire()
+                if state.is_ns_lookup:
+                    if cached_a_ips(state.target, now):
+                        continue
+                else:
+                    cached_answer = answer_from_cache(state.target, state.accumulated)
+                    if cached_answer is not None:
+                        return cached_answer
+                state.nameserver_ips = rotated_roots()
+                work.append(state)
+                continue
+
+            if action == 'delegate':
+                state.nameserver_ips = payload
+                work.append(state)
+                continue
+
+            if action == 'nodata':
+                cache_put_negative(state.target, _A, payload, now)
+                if state.is_ns_lookup:
+                    continue
+                raise Exception(f"No A record for {domain}; authority contains SOA")
+
+            if action == 'dead_end':
+                if state.is_ns_lookup:
+                    continue
+                raise Exception("No delegation records available to continue resolution")
+
+            # 'need_ns': any hostname already resolvable from the cache gives us
+            # IPs for free; otherwise park this entry and queue one child lookup
+            # per hostname so each is resolved exactly once.
+            ns_targets = payload
+            resolved = []
+            seen = set()
+            uncached = []
+            for nh in ns_targets:
+                ips = cached_a_ips(nh, now)
+                if ips:
+                    for ip in ips:
+                        if ip not in seen:
+                            seen.add(ip)
+                            resolved.append(ip)
+                else:
+                    uncached.append(nh)
+            if resolved:
+                state.nameserver_ips = resolved
+                work.append(state)
+                continue
+
+            state.pending_ns = ns_targets
+            work.append(state)
+            for nh in uncached:
+                work.append(ResolverState(nh, state.hops_left, is_ns_lookup=True))
+
+        raise Exception("Exceeded maximum hops while resolving " + domain)
+    finally:
+        sel.close()
+        sock.close()
+